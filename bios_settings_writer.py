@@ -1,39 +1,211 @@
-#! /usr/bin/python
+#! /usr/bin/python3
 
 __author__ = 'wpanderson'
 
 """
-CGI script which takes a 'directory_name', 'file_name', and 'contents' as input, then creates project directories and 
-files within those directories which contain system bios settings. Useful as a template for writing an appache CGI file.
+WSGI application which takes a 'directory_name', 'file_name', and 'contents' as input, then creates project directories
+and files within those directories which contain system bios settings. Useful as a template for writing an appache
+WSGI/CGI file.
+
+Served by mod_wsgi the interpreter, imports, and open resources are reused across requests instead of being rebuilt
+for every upload:
+
+    WSGIDaemonProcess bios_writer processes=2 threads=8
+    WSGIScriptAlias /production_automation/test_bios_settings_writer.py /path/to/bios_settings_writer.py \
+        process-group=bios_writer
+
+Executed directly the application is run as a plain CGI script, so existing CGI deployments keep working.
 
 For error output see /var/log/httpd/error_log
 """
 
-import cgi
+import dbm
+import fcntl
+import hashlib
+import logging
 import os
-# Allow traceback logging in the /root/apache_logs/ directory. Supress displaying these in the browser.
-import cgitb; cgitb.enable(display=0, logdir="/root/apache_logs")
+import re
+from email.parser import BytesParser
+from email.policy import default
+from urllib.parse import parse_qs
+from wsgiref.handlers import CGIHandler
+
+# mod_wsgi does not run the application from the script's directory, so anchor the config store to it explicitly.
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'SUM_BIOS_configs')
+
+# directory_name and file_name become path components, so only accept plain names. Spaces are allowed because
+# customer names end up in both. Names starting with '.' are refused, which rules out '.', '..' and hidden files.
+SAFE_NAME = re.compile(r'[\w -][\w .-]*')
+
+# Index of 'directory/file_name' -> digest of the contents last written there. Tooling retries uploads with identical
+# contents, and those can be answered without rewriting the file. is_safe_name() refuses names starting with '.', so no
+# upload can land on the index or its lock.
+HASH_INDEX = os.path.join(BASE_DIR, '.hashes')
+
+# Failures are logged here when run as CGI. Under mod_wsgi log records go to stderr, which ends up in Apache's
+# error_log.
+LOG_FILE = '/root/apache_logs/writer.log'
+
+logger = logging.getLogger(__name__)
+
+
+def is_safe_name(name):
+    return SAFE_NAME.fullmatch(name) is not None and '..' not in name
+
+
+def write_all(fd, buffers):
+    """
+    Gather write every buffer to fd with os.writev, picking up where a short write left off.
+    """
+    views = [memoryview(buf) for buf in buffers if buf]
+    while views:
+        written = os.writev(fd, views)
+        while views and written >= len(views[0]):
+            written -= len(views[0])
+            views.pop(0)
+        if written:
+            views[0] = views[0][written:]
+
+
+def _close_quietly(index):
+    """
+    Close the hash index, logging rather than raising if that fails.
+    """
+    try:
+        index.close()
+    except Exception:
+        logger.exception('Failed to close hash index %s', HASH_INDEX)
+
+
+def _stamp(digest, st):
+    """
+    Index entry for a file: the digest of its contents plus its mtime and size. If the file is rewritten while the index
+    can't be updated, the stat no longer matches and the stale entry is ignored.
+    """
+    return digest + b'%d %d' % (st.st_mtime_ns, st.st_size)
+
+
+def write_config(directory, file_name, content):
+    """
+    Write content to BASE_DIR/directory/file_name unless the same content is already stored there. The hash index
+    is only an optimization, so any error using it is logged and the config is written regardless.
+
+    :param directory: Project directory, as validated by is_safe_name().
+    :param file_name: Name of the bios config file, as validated by is_safe_name().
+    :param content:   bytes-like object holding the bios config. It is only ever viewed, never copied.
+    :return: True if the file was written, False if it was already up to date.
+    """
+    content = memoryview(content)
+    dir_path = os.path.join(BASE_DIR, directory)
+    path = os.path.join(dir_path, file_name)
+    key = os.path.join(directory, file_name)
+    digest = hashlib.blake2b(content, digest_size=16).digest()
+
+    lock = index = None
+    try:
+        # Several daemon processes and threads share the index, so serialize access to it.
+        try:
+            os.makedirs(BASE_DIR, exist_ok=True)
+            lock = open(HASH_INDEX + '.lock', 'a')
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index = dbm.open(HASH_INDEX, 'c')
+            if os.path.exists(path) and index.get(key) == _stamp(digest, os.stat(path)):
+                return False
+        except Exception:
+            logger.exception('Hash index %s unusable, writing %s without it', HASH_INDEX, key)
+            if index is not None:
+                _close_quietly(index)
+                index = None
+
+        os.makedirs(dir_path, exist_ok=True)
+        # The whole config is already in memory, so skip Python's io stack and hand it straight to the kernel.
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            write_all(fd, [content])
+            st = os.fstat(fd)
+        finally:
+            os.close(fd)
+
+        if index is not None:
+            try:
+                index[key] = _stamp(digest, st)
+            except Exception:
+                logger.exception('Failed to record %s in hash index %s', key, HASH_INDEX)
+    finally:
+        if index is not None:
+            _close_quietly(index)
+        if lock is not None:
+            lock.close()
+    return True
+
+
+def parse_form(environ):
+    """
+    Read the whole POST body with a single read() and split it into fields. urlencoded bodies are handled by parse_qs,
+    multipart bodies by the email package's parser, so the deprecated cgi module isn't needed.
+
+    :return: dict of field name -> bytes of the first value given for it.
+    """
+    try:
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+    body = environ['wsgi.input'].read(length)
+    content_type = environ.get('CONTENT_TYPE', '')
+
+    if content_type.startswith('multipart/'):
+        message = BytesParser(policy=default).parsebytes(b'Content-Type: ' + content_type.encode('latin-1') +
+                                                         b'\r\n\r\n' + body)
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name and name not in fields:
+                fields[name] = part.get_payload(decode=True)
+        return fields
+
+    # parse_qs() re-encodes values given as bytes to ASCII, so any escaped non-ASCII byte would raise. latin-1 maps every
+    # byte to one character and back, so the posted bytes come through unchanged.
+    return {key.encode('latin-1').decode('utf-8', 'replace'): values[0].encode('latin-1')
+            for key, values in parse_qs(body.decode('latin-1'), encoding='latin-1').items()}
+
+
+def application(environ, start_response):
+    """
+    WSGI entry point. Writes the bios config posted as either a urlencoded or a multipart form.
+    """
+    form = parse_form(environ)
+
+    # Only the names are needed as text, the contents are written as the bytes that were posted.
+    directory = form.get('directory_name', b'').decode('utf-8', 'replace')
+    file_name = form.get('file_name', b'').decode('utf-8', 'replace')
+    content = form.get('contents')
+
+    if is_safe_name(directory) and is_safe_name(file_name) and content:
+        try:
+            status = '200 OK'
+            body = 'written\n' if write_config(directory, file_name, content) else 'unchanged\n'
+        except Exception:
+            logger.exception('Failed to write %s/%s', directory, file_name)
+            status = '500 Internal Server Error'
+            body = 'error\n'
+    else:
+        status = '400 Bad Request'
+        # For further debug info in case something goes wrong.
+        body = ('Unable to write to Jarvis. Missing or invalid information.\n'
+                'Directory: {0}\nFile Name: {1}\nContent length: {2}\n'
+                ''.format(directory, file_name, len(content) if content is not None else 0))
+
+    body = body.encode('utf-8')
+    start_response(status, [('Content-Type', 'text/plain'), ('Content-Length', str(len(body)))])
+    return [body]
 
-# Grab each field from a post request and store into variables. 'getfirst()' is just a shorthand instead of using bracket notation.
-form = cgi.FieldStorage()
-directory = form.getfirst('directory_name')
-file_name = form.getfirst('file_name')
-content = form.getfirst('contents')
 
-if directory and file_name and content:
+if __name__ == '__main__':
+    # Keep tracebacks in the /root/apache_logs/ directory rather than displaying them in the browser. If the log can't
+    # be opened they go to stderr instead, so an unwritable log directory never stops a config from being written.
     try:
-        with open('SUM_BIOS_configs/{0}/{1}'.format(directory, file_name), 'wb') as fh:
-            fh.write(content)
-    except (OSError, IOError) as e:
-        os.mkdir('SUM_BIOS_configs/{0}'.format(directory))
-        with open('SUM_BIOS_configs/{0}/{1}'.format(directory, file_name), 'wb') as fh:
-            fh.write(content)
-
-else:
-    # Print the HTML header so apache stops complaining that it's malformed
-    print("Content-Type: text/plain\r\n")
-    print("Unable to write to Jarvis. Missing necessary information.")
-    # For further debug info in case something goes wrong.
-    print("Directory: " + directory)
-    print("File Name: " + file_name)
-    print("Content length: " + str(len(content)))
+        handler = logging.FileHandler(LOG_FILE)
+    except OSError:
+        handler = logging.StreamHandler()
+    logging.basicConfig(handlers=[handler], level=logging.WARNING)
+    CGIHandler().run(application)
@@ -5,10 +5,15 @@ Test script for sending an email from a server. Can be easily modified to work i
 functionality.
 """
 
+import base64
+import copy
+import functools
 import os
+import socket
 
 import smtplib
-from email.mime.application import MIMEApplication
+from dataclasses import dataclass
+from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.utils import COMMASPACE, formatdate
@@ -18,9 +23,132 @@ TO_ADDR = ['ENTER_TO', 'ENTER_TO']
 EMAIL_PASS = 'PW'
 USER_NAME = FROM_ADDR
 
+# Attachments are read and base64 encoded this many bytes at a time. A multiple of 57 bytes encodes to whole 76
+# character lines, so the encoded chunks can be joined as is.
+ATTACHMENT_CHUNK_SIZE = 57 * 1024
+
+# Socket send buffer requested for SMTP sessions so large attachments go out in fewer, fuller writes. The kernel caps
+# this at net.core.wmem_max.
+SEND_BUFFER_SIZE = 1 << 20
+
+
+@dataclass(frozen=True)
+class MailerConfig:
+    """
+    Account and server settings used to send mail. Frozen so a single config can safely back any number of senders
+    built by make_sender().
+    """
+    from_addr: str
+    to_addr: tuple
+    user_name: str
+    password: str
+    server: str = 'smtp.gmail.com:587'
+
+
+DEFAULT_CONFIG = MailerConfig(FROM_ADDR, tuple(TO_ADDR), USER_NAME, EMAIL_PASS)
+
+
+@functools.lru_cache(maxsize=32)
+def _encoded_part(path, mtime, size):
+    """
+    Build the MIME part for one attachment. Base64 encoding is the expensive part of sending, so parts are cached and
+    an attachment sent with many messages is only read and encoded once. mtime and size are part of the cache key so
+    an edited file is encoded again.
+
+    :param path: Path of the file to attach.
+    :return: the encoded MIME part.
+    """
+    name = os.path.basename(path)
+    part = MIMEBase('application', 'octet-stream', Name=name)
+    # Encode the file a chunk at a time rather than reading it whole and encoding a second full size copy.
+    with open(path, 'rb') as fil:
+        part.set_payload(''.join(base64.encodebytes(chunk).decode('ascii')
+                                 for chunk in iter(lambda: fil.read(ATTACHMENT_CHUNK_SIZE), b'')))
+    part['Content-Transfer-Encoding'] = 'base64'
+    # add_header() quotes the filename and RFC 2231 encodes it when it isn't plain ASCII.
+    part.add_header('Content-Disposition', 'attachment', filename=name)
+    return part
+
+
+def build_message(send_from, send_to, subject, text, files=None):
+    """
+    Build a message ready to be handed to Mailer.send(). The multipart shell is built fresh for every message, the
+    attachments come from _encoded_part()'s cache. Each part is shallow copied with its own header list, so headers can
+    be changed per message while the encoded payload string stays shared.
+
+    :return: the message.
+    """
+    msg = MIMEMultipart()
+    msg['From'] = send_from
+    msg['To'] = COMMASPACE.join(send_to)
+    msg['Date'] = formatdate(localtime=True)
+    msg['Subject'] = subject
+
+    msg.attach(MIMEText(text))
+    for f in files or []:
+        cached = _encoded_part(f, os.path.getmtime(f), os.path.getsize(f))
+        # copy.copy() alone would share the cached part's header list.
+        part = copy.copy(cached)
+        part._headers = list(cached._headers)
+        msg.attach(part)
+    return msg
+
+
+class Mailer:
+    """
+    Context manager which holds one authenticated SMTP session open so any number of messages can be sent through it.
+    The TLS handshake and login are paid once per session instead of once per message, so batch scripts should send
+    through a single Mailer:
+
+        with Mailer() as mailer:
+            for subject, text in reports:
+                mailer.send(FROM_ADDR, TO_ADDR, build_message(FROM_ADDR, TO_ADDR, subject, text))
+    """
+
+    def __init__(self, server="smtp.gmail.com:587", user_name=USER_NAME, password=EMAIL_PASS):
+        """
+        :param server:    SMTP server and port to connect to.
+        :param user_name: Account used to log in to the server.
+        :param password:  Password for user_name.
+        """
+        self.server = server
+        self.user_name = user_name
+        self.password = password
+        self.smtp = None
+
+    def __enter__(self):
+        self.smtp = smtplib.SMTP(self.server)
+        # __exit__ isn't called when __enter__ raises, so close the connection here if the handshake fails.
+        try:
+            self.smtp.ehlo()
+            self.smtp.starttls()
+            self.smtp.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
+            self.smtp.login(self.user_name, self.password)
+        except BaseException:
+            self.smtp.close()
+            self.smtp = None
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.smtp.close()
+        self.smtp = None
+
+    def send(self, send_from, send_to, message):
+        """
+        Send a message over the open session. send_message() writes the message to the socket through a
+        BytesGenerator, so no full size string copy of it is made first.
+
+        :param send_from: Envelope sender.
+        :param send_to:   List of envelope recipients. Passed explicitly so Bcc style delivery works as well.
+        :param message:   Message object, usually from build_message().
+        """
+        self.smtp.send_message(message, send_from, send_to)
+
 
 def send_mail(send_from, send_to, subject, text, files=None, server="smtp.gmail.com:587"):
     """
+    Send a single message over its own SMTP session. Use Mailer directly when sending more than one.
 
     :param send_from:
     :param send_to:
@@ -32,30 +160,27 @@ def send_mail(send_from, send_to, subject, text, files=None, server="smtp.gmail.
     """
 
     print('Sending email...')
-    msg = MIMEMultipart()
-    msg['From'] = send_from
-    msg['To'] = COMMASPACE.join(send_to)
-    msg['Date'] = formatdate(localtime=True)
-    msg['Subject'] = subject
-
-    msg.attach(MIMEText(text))
-    # print('prefile')
-    for f in files or []:
-        print('File: ', f)
-        with open(f, 'rb') as fil:
-            part = MIMEApplication(fil.read(), Name=os.path.basename(f))
-            part['Content-Disposition'] = 'attachment; filename="%s"' % os.path.basename(f)
-            msg.attach(part)
-    # print('complete')
-    smtp = smtplib.SMTP(server)
-    smtp.ehlo()
-    smtp.starttls()
-    smtp.login(USER_NAME, EMAIL_PASS)
-    smtp.sendmail(send_from, send_to, msg.as_string())
-    smtp.close()
+    with Mailer(server) as mailer:
+        mailer.send(send_from, send_to, build_message(send_from, send_to, subject, text, files))
     print('Email sent to {0}!'.format(send_to))
 
 
+def make_sender(config=DEFAULT_CONFIG):
+    """
+    Bind a MailerConfig into a send(subject, text, files=None) function. The config fields are captured as default
+    arguments, so each call reads them as fast locals instead of looking up the module globals.
+
+    :param config: MailerConfig to send with.
+    :return: send function.
+    """
+    def send(subject, text, files=None, send_from=config.from_addr, send_to=list(config.to_addr),
+             server=config.server, user_name=config.user_name, password=config.password):
+        with Mailer(server, user_name, password) as mailer:
+            mailer.send(send_from, send_to, build_message(send_from, send_to, subject, text, files))
+
+    return send
+
+
 if __name__ == '__main__':
     send_mail(FROM_ADDR, TO_ADDR, 'Greetings from Wesvis', "Hello Gary,\nIt's nice to meet you. I'm sorry about "
                                                                 "what happened to Solaris.\n\n - Wesvis")
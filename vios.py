@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 __author__ = 'wpanderson'
 version = '1.1.1'
 
@@ -11,21 +11,48 @@ to either update, configure, or compare system BIOS settings.
 """
 
 import sys
+
+# 'vios --version' is answered before anything else is imported. requests and lxml take longer to import than the
+# rest of a version check, and scripts probe for the version often.
+if __name__ == '__main__' and sys.argv[1:] in (['-v'], ['--version']):
+    print('Vios version: ' + version)
+    sys.exit()
+
 import argparse
-from json import loads
+import functools
+import glob
+import io
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.utils import formatdate
 from enum import Enum
+from typing import Callable
 from simech_common import simech_common as sm
 import os
+import pickle
 import requests
+from requests.adapters import HTTPAdapter
+import shutil
 import time
 import re
+from urllib3.util.retry import Retry
+
+# orjson parses syscheck's JSON several times faster than the standard library. Both accept the raw bytes syscheck
+# prints.
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
 
-# cElementTree and ElementTree differ in that cElementTree using C as a base so it's a bit faster.
+# lxml parses with libxml2, which is considerably faster than ElementTree on large SUM XML files and can drop comments
+# while it parses. Fall back to the standard library if it isn't installed.
 try:
-    import xml.etree.cElementTree as ET
-except:
+    from lxml import etree as ET
+    _XML_PARSER_OPTIONS = {'remove_comments': True, 'huge_tree': True}
+except ImportError:
     import xml.etree.ElementTree as ET
+    _XML_PARSER_OPTIONS = {}
 
 
 # Binaries used by vios to gather bios settings
@@ -37,13 +64,241 @@ bios_settings_dir = os.path.expanduser('~/bios_settings/')
 
 # Links for gathering Golden Template data from Jarvis
 jarvis_bios_settings = 'http://jarvis.wpanderson.com/production_automation/SUM_BIOS_configs/'
+# (connect, read) timeout in seconds for every request made to Jarvis.
+jarvis_timeout = (3, 30)
+
+# Patterns for parsing bios files and Jarvis listings, compiled once instead of looked up on every call.
+# Single pass tokenizers for plain text bios files. Each match is a '[menu]' header or a 'key=value' setting, and
+# comments never match: SUM files comment with '#' and '//', syscfg INI files with ';'.
+_SUM_TOKEN_RE = re.compile(r'^(?:[ \t]*\[(?P<menu>(?:(?!//)[^#\n])*)\]'
+                           r'|(?P<key>(?:(?!//)[^#=\n])+)=(?P<val>(?:(?!//)[^#\n])*))', re.MULTILINE)
+_INI_TOKEN_RE = re.compile(r'^(?:[ \t]*\[(?P<menu>[^;\n]*)\]|(?P<key>[^;=\n]+)=(?P<val>[^;\n]*))', re.MULTILINE)
+# Captures just the file name, and can't run past the closing quote into the next link on the line.
+_GT_HREF_RE = re.compile(r'href="\.?/?(GOLDEN_TEMPLATE[^"]*?\.(?:bios|INI))"', re.IGNORECASE)
+_GT_URL_NAME_RE = re.compile(r'(GOLDEN_TEMPLATE.*(\.bios|\.INI))', re.IGNORECASE)
+_GT_URL_BIOS_TAIL_RE = re.compile(r'.bios\Z')
+_GT_URL_INI_TAIL_RE = re.compile(r'.INI\Z')
+
+# dmidecode and ipmicfg print one 'Field: value' per line. Matches every field vios reads in a single pass over the raw
+# bytes a tool prints, anchored to the start of a line so a field name appearing inside some other value can't match.
+_FIELD_RE = re.compile(rb'^[ \t]*(Product Name|Serial Number|Version|Firmware Version):[ \t]+(.*)$', re.MULTILINE)
+# Baseboard vendors vios supports, as named in dmidecode's output.
+_VENDOR_RE = re.compile(rb'intel|supermicro', re.IGNORECASE)
+
+# Bits of system information gather_system_info() can be asked for, so each run only pays for the tools it needs.
+NEED_TROGDOR = 1        # Project, customer, order and serial numbers from syscheck.
+NEED_MODEL = 2          # Motherboard model and serial from dmidecode.
+NEED_BIOS_VERSION = 4   # Bios version from dmidecode.
+NEED_IPMI = 8           # IPMI firmware version from ipmicfg.
+NEED_ALL = NEED_TROGDOR | NEED_MODEL | NEED_BIOS_VERSION | NEED_IPMI
+
+# The kernel exports the DMI fields dmidecode reports here, readable without running anything.
+dmi_id_dir = '/sys/class/dmi/id/'
+
+# Golden Templates are streamed from Jarvis to disk this many bytes at a time.
+_GT_CHUNK_SIZE = 64 * 1024
+# Jarvis serves the registered trademark sign in some templates as a UTF-8 replacement character. It's swapped back
+# while the bytes are streamed.
+_REPLACEMENT_CHAR = u'\ufffd'.encode('utf-8')
+_REGISTERED_SIGN = u'\u00ae'.encode('utf-8')
+
+# Sentinel for settings missing from the Golden Template, since None is a valid setting value.
+_MISSING = object()
+
+
+def _fields(output):
+    """
+    Collect the fields _FIELD_RE knows about from the output of dmidecode or ipmicfg. Each output is scanned on its own,
+    since dmidecode prints a Version for the baseboard as well as for the bios.
 
-# Color codes for text formatting.
-RED = '\033[31m'
-GREEN = '\033[32m'
-YELLOW = '\033[33m'
-BOLD = '\033[1m'
-END = '\033[0m'
+    :param output: bytes printed by the tool.
+    :return: dict of field name -> bytes of the first value given for it.
+    """
+    fields = {}
+    for match in _FIELD_RE.finditer(output):
+        fields.setdefault(match.group(1), match.group(2))
+    return fields
+
+
+def _read_dmi_id(name):
+    """
+    Read one DMI field from sysfs.
+
+    :param name: File in dmi_id_dir, e.g. 'board_vendor'.
+    :return: bytes of the value, or None if the kernel doesn't export it or it can't be read.
+    """
+    try:
+        with open(os.path.join(dmi_id_dir, name), 'rb') as fh:
+            return fh.read().strip() or None
+    except (IOError, OSError):
+        return None
+
+
+def _retry(times, backoff):
+    """
+    Decorator which calls a command running function again when the command fails, so one flaky dmidecode or ipmicfg
+    run doesn't throw away everything gathered so far. A missing binary is not retried.
+
+    :param times:   Number of attempts in total.
+    :param backoff: Seconds to wait before the second attempt, doubling for each attempt after.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(times):
+                try:
+                    return func(*args, **kwargs)
+                except FileNotFoundError:
+                    raise
+                except (subprocess.CalledProcessError, OSError):
+                    if attempt == times - 1:
+                        raise
+                    time.sleep(backoff * 2 ** attempt)
+        return wrapper
+    return decorator
+
+
+@_retry(times=2, backoff=0.5)
+def _query(argv):
+    """
+    Run one of the system information tools and return what it prints.
+
+    :param argv: The command and its arguments as a list.
+    :return: bytes printed by the command.
+    :raises subprocess.CalledProcessError: if the command still exits non-zero after retrying.
+    """
+    return subprocess.check_output(argv, stderr=subprocess.DEVNULL)
+
+
+def _spawn(argv):
+    """
+    Start a command directly, without a /bin/sh in between, and return without waiting for it. Lets the caller get on
+    with other work while a slow sum or syscfg call runs; collect the result with _wait().
+
+    :param argv: The command and its arguments as a list.
+    :return: Popen object for the running command.
+    :raises OSError: if the command could not be started.
+    """
+    return subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def _wait(proc):
+    """
+    Wait for a command started by _spawn() to finish.
+
+    :param proc: Popen object returned by _spawn().
+    :return: stdout of the command.
+    :raises subprocess.CalledProcessError: if the command exits non-zero.
+    """
+    stdout, stderr = proc.communicate()
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, proc.args, stdout, stderr)
+    return stdout
+
+
+def _run(argv):
+    """
+    Run a command directly, without a /bin/sh in between, and return its output as text.
+
+    :param argv: The command and its arguments as a list.
+    :return: stdout of the command.
+    :raises subprocess.CalledProcessError: if the command exits non-zero.
+    :raises OSError: if the command could not be started.
+    """
+    return _wait(_spawn(argv))
+
+
+def _purge(pattern, keep=None):
+    """
+    Remove every file in the bios_settings_dir matching a glob pattern. The match is done by glob against the directory
+    listing, with no per file regex. Files which disappear before they can be removed are ignored.
+
+    :param pattern: glob pattern relative to bios_settings_dir, e.g. 'GOLDEN_TEMPLATE*'.
+    :param keep:    Path of a matching file to leave in place, such as one a running command is writing.
+    """
+    for path in glob.iglob(os.path.join(bios_settings_dir, pattern)):
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _load_cache(path, key):
+    """
+    Load a value pickled by _store_cache().
+
+    :param path: Cache file to read.
+    :param key:  Key the value must have been stored under, anything which makes the cache stale belongs in it.
+    :return: The cached value, or None if there is no usable cache for key.
+    """
+    try:
+        with open(path, 'rb') as fh:
+            cached_key, value = pickle.load(fh)
+        if cached_key == key:
+            return value
+    except Exception:
+        # A missing, stale format, or corrupt cache just means doing the work again.
+        pass
+    return None
+
+
+def _store_cache(path, key, value):
+    """
+    Pickle value under key for _load_cache(). The cache is written to a temporary file and renamed into place so an
+    interrupted run never leaves a truncated cache. The temporary file's name starts with a '.' so _purge() patterns
+    never match it.
+
+    :param path:  Cache file to write.
+    :param key:   Key to store value under.
+    :param value: Picklable value to cache.
+    :return: True if the cache was written.
+    """
+    tmp_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.tmp')
+    try:
+        with open(tmp_path, 'wb') as fh:
+            pickle.dump((key, value), fh, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def _stream_to_file(response, path):
+    """
+    Write the body of a streamed response to path a chunk at a time, so the whole Golden Template is never held in
+    memory. Replacement characters are remapped to the registered sign byte-wise, holding back a partial match at the
+    end of a chunk until the next chunk arrives.
+
+    :param response: requests Response opened with stream=True.
+    :param path:     File to write the body to.
+    :return: Number of bytes written.
+    """
+    written = 0
+    carry = b''
+    with open(path, 'wb') as fw:
+        for chunk in response.iter_content(_GT_CHUNK_SIZE):
+            buf = (carry + chunk).replace(_REPLACEMENT_CHAR, _REGISTERED_SIGN)
+            keep = 2 if buf.endswith(_REPLACEMENT_CHAR[:2]) else 1 if buf.endswith(_REPLACEMENT_CHAR[:1]) else 0
+            carry = buf[len(buf) - keep:]
+            fw.write(buf[:len(buf) - keep])
+            written += len(buf) - keep
+        fw.write(carry)
+    return written + len(carry)
+
+
+# Color codes for text formatting. Left empty when output is piped or redirected, so logs don't fill up with escapes.
+_TTY = sys.stdout.isatty()
+RED = '\033[31m' if _TTY else ''
+GREEN = '\033[32m' if _TTY else ''
+YELLOW = '\033[33m' if _TTY else ''
+BOLD = '\033[1m' if _TTY else ''
+END = '\033[0m' if _TTY else ''
+
+# Messages printed on every run, built once and written straight to stdout.
+_HEADER = f'{GREEN}Vios version: {version}{END}\n'
+_MSG_GATHER = f'{YELLOW}Gathering system information... This may take a minute.{END}\n'
 
 
 class Baseboard(Enum):
@@ -60,6 +315,44 @@ class Baseboard(Enum):
     OTHER = 'other'
 
 
+@dataclass(frozen=True)
+class BoardOps:
+    """
+    The bios tool, and how to drive it, for one supported baseboard. A Bios object looks its BoardOps up once from the
+    baseboard, so the operations it runs don't each branch on the baseboard again.
+
+    :param binary:          Binary used to read and write bios settings, for messages.
+    :param ext:             Extension bios settings files must be saved with for the binary to accept them.
+    :param get_cmd:         Function of a file path returning the argv which saves the current bios settings there.
+    :param apply_cmd:       Function of a file path returning the argv which applies the bios settings in it.
+    :param success_marker:  Lower case text the binary prints when settings were saved successfully.
+    """
+    binary: str
+    ext: str
+    get_cmd: Callable[[str], list]
+    apply_cmd: Callable[[str], list]
+    success_marker: str
+
+
+_BOARD_OPS = {
+    Baseboard.SUPERMICRO: BoardOps(sum_binary, '.bios',
+                                   lambda path: [sum_binary, '-c', 'getcurrentbioscfg', '--file', path],
+                                   lambda path: [sum_binary, '-c', 'ChangeBiosCfg', '--file', path],
+                                   'created'),
+    # Intel bios files have to be saved as .INI to be recognized by syscfg
+    Baseboard.INTEL: BoardOps(intel_binary, '.INI',
+                              lambda path: [intel_binary, '/s', path, '/b'],
+                              lambda path: [intel_binary, '/r', path, '/b'],
+                              'successfully completed'),
+}
+
+# Motherboard manufacturer as named by syscheck -> Baseboard. Anything else is Baseboard.OTHER.
+_MFG_MAP = {
+    'Supermicro': Baseboard.SUPERMICRO,
+    'Intel': Baseboard.INTEL,
+}
+
+
 class SystemInfo:
     """
     Class for storing system information.
@@ -110,12 +403,12 @@ class SystemInfo:
             - gather_system_info()
         """
         try:
-            output = subprocess.check_output(sum_binary + ' -c CheckOOBSupport', shell=True)
-            if not re.search('Node Product Key Activated\.*OOB', output) \
-                    and not re.search('Feature Toggled On\.*Yes', output):
+            output = _run([sum_binary, '-c', 'CheckOOBSupport'])
+            if not re.search(r'Node Product Key Activated\.*OOB', output) \
+                    and not re.search(r'Feature Toggled On\.*Yes', output):
                 sm.error('System has not been activated, please activate the system before continuing.', output)
                 exit()
-        except subprocess.CalledProcessError or OSError as e:
+        except (subprocess.CalledProcessError, OSError) as e:
             sm.error('Failed to check activation status. Error was:', str(e))
             exit()
 
@@ -125,12 +418,11 @@ class SystemInfo:
         flag during program execution.
         """
 
-        print(BOLD + ' Project Number: {0}\n SM Number:      {1}\n Customer:       {2}\n Order Number:   {3}\n'
-                     ' ==========Baseboard Information==========\n'
-                     ' Baseboard type: {4}\n Bios Version:   {5}\n Model Number:   {6}\n IPMI:           {7}\n'
-                     ' Serial:         {8}\n'
-                     ''.format(self.p_number, self.sm_number, self.customer, self.order, self.baseboard.name,
-                        self.bios, self.model, self.ipmi_version, self.m_serial)) + END
+        print(f'{BOLD} Project Number: {self.p_number}\n SM Number:      {self.sm_number}\n'
+              f' Customer:       {self.customer}\n Order Number:   {self.order}\n'
+              f' ==========Baseboard Information==========\n'
+              f' Baseboard type: {self.baseboard.name}\n Bios Version:   {self.bios}\n Model Number:   {self.model}\n'
+              f' IPMI:           {self.ipmi_version}\n Serial:         {self.m_serial}\n{END}')
 
 
 class Bios:
@@ -139,17 +431,27 @@ class Bios:
         - Comparing the current bios settings to golden template settings.
         - Applying latest/supplied golden template settings.
         - Uploading current bios settings as the Golden Template for this system.
+
+    Every instance shares one HTTP session, so all Jarvis requests made during a run reuse a keep-alive connection
+    instead of reconnecting for the listing, download and upload. Failed connections and reads are retried with
+    backoff.
     """
 
+    _session = requests.Session()
+    _session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=4,
+                                          max_retries=Retry(total=3, backoff_factor=0.3)))
+
     def __init__(self, system_info):
         """
         :param system_info:         SystemInfo object for direct access to the system information variables.
         :param gt_file:             Name of the Golden Template for the system.
         :param current_bios_file:   Name of the current bios file for the system.
+        :param ops:                 BoardOps for the system's baseboard, None if the baseboard is not supported.
         """
         self.system_info = system_info
         self.gt_file = ''
         self.current_bios_file = ''
+        self.ops = _BOARD_OPS.get(system_info.baseboard)
 
     def upload_gt(self):
         """
@@ -168,109 +470,103 @@ class Bios:
             --auto
             --upload
         """
-        response = raw_input(BOLD + 'Would you like to set the current bios settings as the Golden Template for this '
-                                    'system? This means the current BIOS settings are 100% correct... Continue? (y/n):'
-                                    '' + END)
+        response = input(BOLD + 'Would you like to set the current bios settings as the Golden Template for this '
+                                'system? This means the current BIOS settings are 100% correct... Continue? (y/n):'
+                                '' + END)
 
         if 'y' not in response.lower():
             print('Exiting Vios configuration...')
             exit()
 
-        # Remove all Golden Template files in the ~/bios_settings/ folder.
-        try:
-            gt_files = os.listdir(bios_settings_dir)
-            for gt in gt_files:
-                if re.search('golden_template', gt.lower()):
-                    os.remove(os.path.join(bios_settings_dir, gt))
-        except (IOError, OSError) as e:
-            sm.error('Unable to remove previous Golden_Template files')
-
         if not self.system_info.p_number or not self.system_info.customer:
             sm.error('Not enough Trogdor information to generate a Golden Template... Missing project or customer info.')
             exit()
 
-        gt_name = 'GOLDEN_TEMPLATE_{0}_{1}_{2}'.format(self.system_info.p_number, self.system_info.customer,
-                                                       self.system_info.date)
-        if self.system_info.baseboard == Baseboard.SUPERMICRO:
-            gt_name = gt_name + '.bios'
-            try:
-                output = subprocess.check_output(sum_binary +' -c getcurrentbioscfg --file ' + bios_settings_dir
-                                                 + gt_name, shell=True)
-                self.gt_file = os.path.join(bios_settings_dir, gt_name)
-            except subprocess.CalledProcessError or OSError as e:
-                sm.error('Vios failed to generate the current BIOS settings for the Golden Template... Error was:',
-                         str(output))
-                exit()
-        elif self.system_info.baseboard == Baseboard.INTEL:
-            gt_name = gt_name + '.INI'
-            try:
-                output = subprocess.check_output('syscfg /s {0} /b'.format(bios_settings_dir + gt_name),
-                                                 shell=True)
-                if 'Successfully Completed' in output:
-                    self.gt_file = os.path.join(bios_settings_dir, gt_name)
-                else:
-                    sm.error('Vios could not ')
-            except (subprocess.CalledProcessError, IOError, OSError) as e:
-                sm.error('Unable to get current bios settings for syscfg. Error was:', str(e))
-                exit()
+        if self.ops is None:
+            sm.error('Unable to generate a Golden Template, Baseboard is not supported.')
+            exit()
+
+        # sum and syscfg take several seconds to dump the settings, so the previous Golden Template files, and their
+        # parse caches, are removed from the ~/bios_settings/ folder while they run.
+        gt_name = (f'GOLDEN_TEMPLATE_{self.system_info.p_number}_{self.system_info.customer}_{self.system_info.date}'
+                   f'{self.ops.ext}')
+        gt_file = os.path.join(bios_settings_dir, gt_name)
+        try:
+            proc = _spawn(self.ops.get_cmd(gt_file))
+            _purge('GOLDEN_TEMPLATE*', keep=gt_file)
+            output = _wait(proc)
+            if self.ops.success_marker not in output.lower():
+                raise OSError(output.strip())
+            self.gt_file = gt_file
+        except (subprocess.CalledProcessError, OSError) as e:
+            sm.error('Vios failed to generate the current BIOS settings for the Golden Template... Error was:',
+                     str(e))
+            exit()
 
         # Determine the type of BIOS file generated, XML or Plain text, and write to the file Trogdor info.
         try:
-            with open(self.gt_file, mode='r+') as fh:
-                content = fh.read()
+            with open(self.gt_file, 'rb') as src:
+                first = src.read(1)
+                src.seek(0)
                 cp = ''
                 cs = ''
 
-                if re.search('^#', content):
+                if first == b'#':
                     cp = '\n#'
-                elif re.search('^<', content):
+                elif first == b'<':
                     cp = '\n<!--'
                     cs = '-->'
-                elif re.search('^;', content):
+                elif first == b';':
                     cp = '\n; '
                 else:
                     sm.error('Unable to identify Golden Template as plain or XML type.')
                     exit()
 
-                stamp = cp.strip('\n') + " " + self.system_info.date + cs
-                stamp += cp + " File Name:  " + gt_name + cs
-                stamp += cp + " Customer:  " + self.system_info.customer + cs
-                stamp += cp + " Project:  " + self.system_info.p_number + cs
-                stamp += cp + " Order Number:  " + self.system_info.order + cs
-                stamp += cp + " Template generated on SM Number:  " + self.system_info.sm_number + cs
-                stamp += cp + " Motherboard Model:  " + self.system_info.model + cs
-                stamp += cp + " BIOS / IPMI:  " + self.system_info.bios + " / " + self.system_info.ipmi_version + cs
-                stamp += cp + " Motherboard Serial:  " + self.system_info.m_serial + cs
-                stamp += cp + " VIOS version " + version + cs + "\n"
-                # If a Unicode Error is found while modifying the text, i.e. A Unicode character is found, normalize
-                # the text and write that content to the file.
-                try:
-                    content = stamp + content
-                except UnicodeDecodeError:
-                    content = stamp.decode('latin-1') + content.decode('latin-1')
-                fh.seek(0)
-                try:
-                    fh.write(content)
-                except UnicodeEncodeError:
-                    content = content.encode('latin-1')
-                    fh.write(content)
+                si = self.system_info
+                lead = cp.strip('\n')
+                stamp = (f'{lead} {si.date}{cs}'
+                         f'{cp} File Name:  {gt_name}{cs}'
+                         f'{cp} Customer:  {si.customer}{cs}'
+                         f'{cp} Project:  {si.p_number}{cs}'
+                         f'{cp} Order Number:  {si.order}{cs}'
+                         f'{cp} Template generated on SM Number:  {si.sm_number}{cs}'
+                         f'{cp} Motherboard Model:  {si.model}{cs}'
+                         f'{cp} BIOS / IPMI:  {si.bios} / {si.ipmi_version}{cs}'
+                         f'{cp} Motherboard Serial:  {si.m_serial}{cs}'
+                         f'{cp} VIOS version {version}{cs}\n').encode('utf-8', errors='replace')
+
+                # Write the stamp followed by the untouched settings to a temporary file and swap it in, rather than
+                # reading the whole file in to rewrite it in place.
+                tmp_file = os.path.join(bios_settings_dir, '.' + gt_name + '.part')
+                with open(tmp_file, 'wb') as tmp_fh:
+                    tmp_fh.write(stamp)
+                    shutil.copyfileobj(src, tmp_fh, _GT_CHUNK_SIZE)
+            os.replace(tmp_file, self.gt_file)
         except (IOError, OSError) as e:
-            sm.error('Unable to load and stamp {0}. Error Was:'.format(gt_name), str(e))
+            sm.error(f'Unable to load and stamp {gt_name}. Error Was:', str(e))
             exit()
 
-        up_dict = {'directory_name': '{0}'.format(self.system_info.p_number + '_' + self.system_info.customer),
-                   'file_name':gt_name, 'contents':content}
+        up_dict = {'directory_name': self.system_info.p_number + '_' + self.system_info.customer,
+                   'file_name':gt_name}
 
-        jarvis_directory = 'http://jarvis.wpanderson.com/production_automation/SUM_BIOS_configs/{0}/{1}'.format(
-            up_dict['directory_name'], up_dict['file_name'])
+        jarvis_directory = (f'http://jarvis.wpanderson.com/production_automation/SUM_BIOS_configs/'
+                            f'{up_dict["directory_name"]}/{up_dict["file_name"]}')
 
         try:
-            r = requests.post('http://jarvis.wpanderson.com/production_automation/test_bios_settings_writer.py',
-                              up_dict)
-            print(GREEN + 'Success! {0} was uploaded to Jarvis as {1}.'.format(gt_name, jarvis_directory) + END)
+            # Sent as a multipart file upload straight from the stamped file, so vios never holds a copy of it.
+            with open(self.gt_file, 'rb') as fh:
+                r = self._session.post(
+                    'http://jarvis.wpanderson.com/production_automation/test_bios_settings_writer.py', up_dict,
+                    files={'contents': (gt_name, fh)}, timeout=jarvis_timeout)
+            # The writer answers 400 for names it refuses and 500 when it cannot write, so only a 2xx is a success.
+            r.raise_for_status()
+            print(f'{GREEN}Success! {gt_name} was uploaded to Jarvis as {jarvis_directory}.{END}')
         except requests.RequestException as e:
             sm.error('Vios failed to upload a Golden Template... Error was:', str(e))
             exit()
+        except (IOError, OSError) as e:
+            sm.error(f'Unable to read {self.gt_file} for upload. Error was:', str(e))
+            exit()
 
     def get_gt(self, gt_url=None):
         """
@@ -292,29 +588,51 @@ class Bios:
                 - Write it to memory
             - Continue
         """
-        gt_data = None
+        gt_name = None
         try:
             if gt_url:
-                if self.system_info.baseboard == Baseboard.INTEL and re.search('.bios\Z', gt_url):
+                if self.system_info.baseboard == Baseboard.INTEL and _GT_URL_BIOS_TAIL_RE.search(gt_url):
                     sm.error('Invalid URL. Intel systems are not compatible with Supermicro bios settings.')
                     exit()
-                elif self.system_info.baseboard == Baseboard.SUPERMICRO and re.search('.INI\Z', gt_url):
+                elif self.system_info.baseboard == Baseboard.SUPERMICRO and _GT_URL_INI_TAIL_RE.search(gt_url):
                     sm.error('Invalid URL. Supermicro systems are not compatible with Intel bios settings.')
                     exit()
-                r = requests.get(gt_url)
-                gt_data = r.text
-                self.gt_file = os.path.join(bios_settings_dir, re.search('(GOLDEN_TEMPLATE.*(\.bios|\.INI))', gt_url,
-                                                                          re.IGNORECASE).group(1))
+                gt_name = _GT_URL_NAME_RE.search(gt_url).group(1)
             else:
-                data = requests.get(jarvis_bios_settings + system.p_number + '_' + system.customer + '/')
-                gt_list = re.findall('href="\.?\/?(GOLDEN_TEMPLATE.*(\.bios|\.INI))"', data.text, re.IGNORECASE)
+                gt_dir = jarvis_bios_settings + self.system_info.p_number + '_' + self.system_info.customer + '/'
+                data = self._session.get(gt_dir, timeout=jarvis_timeout)
+                gt_list = _GT_HREF_RE.findall(data.text)
                 if gt_list:
-                    latest = sorted(gt_list, reverse=True)
-                    r = requests.get(jarvis_bios_settings + system.p_number + '_' + system.customer + '/' +
-                                           latest[0][0])
-                    gt_data = r.text
-                    self.gt_file = os.path.join(bios_settings_dir, latest[0][0])
-            if not gt_data:
+                    # Names end in the date they were generated, so the greatest name is the newest template.
+                    gt_name = max(gt_list)
+                    gt_url = gt_dir + gt_name
+
+            written = 0
+            if gt_name:
+                local_file = os.path.join(bios_settings_dir, gt_name)
+                # When this Golden Template was already downloaded (or uploaded) by an earlier run, only ask Jarvis for
+                # it if it has changed since. This also keeps the local parse cache for it warm.
+                headers = {}
+                if os.path.exists(local_file):
+                    headers['If-Modified-Since'] = formatdate(os.path.getmtime(local_file), usegmt=True)
+
+                # Download next to the final file under a dot name, which _purge() leaves alone, so any existing
+                # Golden Template is only replaced once a complete download is on disk.
+                part_file = os.path.join(bios_settings_dir, '.' + gt_name + '.part')
+                with self._session.get(gt_url, headers=headers, stream=True, timeout=jarvis_timeout) as r:
+                    r.raise_for_status()
+                    if r.status_code == requests.codes.not_modified:
+                        self.gt_file = local_file
+                        return
+                    written = _stream_to_file(r, part_file)
+                if written:
+                    self.gt_file = local_file
+                    # Remove any existing Golden Template files then move the latest or specified GT into place.
+                    _purge('GOLDEN_TEMPLATE*')
+                    os.replace(part_file, self.gt_file)
+                else:
+                    os.remove(part_file)
+            if not written:
                 print('No Golden Template could be found for the system...')
                 print('If you would like to upload the current BIOS settings as the Golden Template please run '
                       '<vios --upload>.')
@@ -325,33 +643,8 @@ class Bios:
         except AttributeError as e:
             sm.error('Vios was unable to parse Golden Template file. Error Was:', str(e))
             exit()
-
-        try:
-            file_list = os.listdir(bios_settings_dir)
-        except (IOError, OSError):
-            os.mkdir(bios_settings_dir)
-            file_list = os.listdir(bios_settings_dir)
-
-        if gt_data:
-            try:
-                # Remove any existing Golden Template files then write the latest or specified GT to the system.
-                for gt in file_list:
-                    if re.search('(GOLDEN_TEMPLATE.*(\.bios|\.INI))', gt):
-                        os.remove(os.path.join(bios_settings_dir + gt))
-                with open(self.gt_file, 'w') as fw:
-                    try:
-                        fw.write(gt_data)
-                    except (UnicodeEncodeError, UnicodeDecodeError):
-                        #Added support for unicode characters.
-                        gt_data = unicode(gt_data)
-                        gt_data = gt_data.replace(u'\ufffd', u'\u00ae')
-                        gt_data = gt_data.encode('ISO-8859-1')
-                        fw.write(gt_data)
-            except (IOError, OSError) as e:
-                sm.error('Vios could not save {0} to {0}... Error was:'.format(self.gt_file, bios_settings_dir), str(e))
-                exit()
-        elif not gt_data and not self.gt_file:
-            sm.error('Vios could not get the latest Golden Template data... Exiting.')
+        except (IOError, OSError) as e:
+            sm.error(f'Vios could not save {gt_name} to {bios_settings_dir}... Error was:', str(e))
             exit()
 
     def get_bios_settings(self):
@@ -366,101 +659,98 @@ class Bios:
             --upload
 
         Steps:
-            - Remove previous settings files that exist on the system.
             - Generate new bios current bios settings file
+            - Remove previous settings files that exist on the system while it is generated.
             - Save file in bios_settings_dir
 
         current bios settings syntax: sum -c getcurrentbioscfg --file current_bios_settings_YYYY-MM-DD-HH-MM-SS.bios
         """
-        try:
-            bios_files = os.listdir(bios_settings_dir)
-        except (IOError, OSError):
-            os.mkdir(bios_settings_dir)
-            bios_files = os.listdir(bios_settings_dir)
-        bios_file_name = time.strftime('current_bios_settings_%Y-%m-%d-%H-%M-%S')
-        for x in bios_files:
-            if re.search('current_bios', x, re.IGNORECASE):
-                os.remove(bios_settings_dir + x)
+        if self.ops is None:
+            sm.error('Unable to get current bios settings, Baseboard is not supported.')
+            exit()
 
+        bios_file = os.path.join(bios_settings_dir,
+                                 time.strftime('current_bios_settings_%Y-%m-%d-%H-%M-%S') + self.ops.ext)
         try:
-            if self.system_info.baseboard == Baseboard.SUPERMICRO:
-                try:
-                    output = subprocess.check_output('sum -c getcurrentbioscfg --file {0}'.format(bios_settings_dir +
-                                                                                       bios_file_name +
-                                                                                       '.bios'), shell=True)
-                    if 'created' in output.lower():
-                        self.current_bios_file = bios_settings_dir + bios_file_name + '.bios'
-                    else:
-                        raise OSError
-                except OSError as e:
-                    sm.error('Unable to get current bios settings from sum. error was:', str(e))
-                    exit()
-
-            elif self.system_info.baseboard == Baseboard.INTEL:
-                try:
-                    # Intel bios files have to be saved as .INI to be recognized by syscfg
-                    output = subprocess.check_output('syscfg /s {0} /b'.format(bios_settings_dir + bios_file_name + '.INI'),
-                                          shell=True)
-
-                    if 'successfully completed' in output.lower():
-                        self.current_bios_file = bios_settings_dir + bios_file_name + '.INI'
-                    else:
-                        raise OSError
-                except OSError as e:
-                    sm.error('Unable to get current bios settings for syscfg. Error was:', str(e))
-                    exit()
+            proc = _spawn(self.ops.get_cmd(bios_file))
+            _purge('current_bios*', keep=bios_file)
+            output = _wait(proc)
+            if self.ops.success_marker not in output.lower():
+                raise OSError(output.strip())
+            self.current_bios_file = bios_file
         except subprocess.CalledProcessError as e:
             sm.error('Vios was unable to acquire current BIOS settings... Error was:', str(e))
             exit()
+        except OSError as e:
+            sm.error(f'Unable to get current bios settings from {self.ops.binary}. Error was:', str(e))
+            exit()
 
-    def parse_xml_tree(self, bios_data, path, tree):
+    def parse_xml_tree(self, source):
         """
-        A recursive function for gathering menus and settings from a tree generated from an XML bios file. Designed to output
-        the same data structure as the the plain_text parsing section, gather_children takes a dictionary bios_data, the
-        current path, and the current node of the tree structure and dives into tree recursively until all menus have been
-        explored and added to the settings dictionary which is then added to bios_data with a key value of the path.
+        Stream menus and settings out of an XML bios file. Designed to output the same data structure as the the
+        plain_text parsing section. Rather than building the whole tree and diving into it recursively, the file is
+        consumed as a stream of start and end events. A stack follows the path of menus down to the current element,
+        each menu collects its settings as their elements close, and finished elements are cleared so only the open
+        branch of the tree is ever held in memory. Every top level menu except 'Main' is gathered along with all of the
+        menus nested inside it.
 
         Called by:
             --compare
 
-        :param bios_data: dictionary to store bios file settings
-        :param path: The current path to the settings. As the function dives into the tree this will change with menus
-                    separated by '|'
-        :param tree: Tree structure of xml attributes (Menus, Settings, Text, etc...). This function only cares about Menus
-                    and Settings.
-        :return bios_data: Modified dictionary with key values of the different menus and values which are dictionaries of the
-                    settings.
+        :param source: File object of the XML bios file, positioned at its XML declaration.
+        :return bios_data: Dictionary with key values of the different menus, separated by '|', and values which are
+                    dictionaries of the settings.
         """
-        settings = {}
-
-        for element in tree:
-            if element.tag == 'Setting':
-                try:
-                    settings[element.attrib['name']] = element.attrib['selectedOption']
-                except KeyError:
-                    try:
-                        settings[element.attrib['name']] = element.attrib['checkedStatus']
-                    except KeyError:
-                        try:
-                            settings[element.attrib['name']] = element.attrib['settingValue']
-                        except KeyError:
-                            try:
-                                # For 'Password' and 'String' settings:
-                                # You must dive into the element tree for each setting to get a value.
-                                if element.attrib['type'] == 'Password':
-                                    settings[element.attrib['name']] = element[0].find('HasPassword').text
-                                elif element.attrib['type'] == 'String':
-                                    settings[element.attrib['name']] = element.find('StringValue').text
-                            except KeyError:
-                                settings[element.attrib['name']] = None
-                                sm.error('Encountered an unknown setting of type {0}. Setting was:'
-                                         ''.format(element.attrib['type']), '{0}'.format(element.attrib['name']))
-
-            if element.tag == 'Menu':
-                bios_data = self.parse_xml_tree(bios_data, path + '|' + element.attrib['name'], element.getchildren())
-
-        if settings != {}:
-            bios_data[path] = settings
+        bios_data = {}
+        # One entry per open element: (path, settings) for menus being gathered and None for anything else.
+        stack = []
+        root = None
+
+        for event, element in ET.iterparse(source, events=('start', 'end'), **_XML_PARSER_OPTIONS):
+            if event == 'start':
+                menu = None
+                if root is None:
+                    root = element
+                elif element.tag == 'Menu':
+                    if len(stack) == 1:
+                        if element.attrib['name'] != 'Main':
+                            menu = (element.attrib['name'], {})
+                    elif stack[-1] is not None:
+                        menu = (stack[-1][0] + '|' + element.attrib['name'], {})
+                stack.append(menu)
+                continue
+
+            menu = stack.pop()
+            if element.tag == 'Setting' and stack and stack[-1] is not None:
+                settings = stack[-1][1]
+                # Ordered by how often each attribute carries the value in SUM files, most Settings stop at the first.
+                a = element.attrib
+                value = a.get('selectedOption')
+                if value is None:
+                    value = a.get('checkedStatus')
+                    if value is None:
+                        value = a.get('settingValue')
+                        if value is None:
+                            # For 'Password' and 'String' settings:
+                            # You must dive into the element tree for each setting to get a value.
+                            setting_type = a.get('type')
+                            if setting_type == 'Password':
+                                value = element[0].findtext('HasPassword')
+                            elif setting_type == 'String':
+                                value = element.findtext('StringValue')
+                            else:
+                                sm.error(f'Encountered an unknown setting of type {setting_type}. Setting was:',
+                                         a.get('name'))
+                settings[a['name']] = value
+                element.clear()
+            elif menu is not None:
+                if menu[1]:
+                    bios_data[menu[0]] = menu[1]
+                element.clear()
+
+            # A top level element has been fully handled, release it from the root.
+            if len(stack) == 1:
+                root.clear()
 
         return bios_data
 
@@ -485,88 +775,118 @@ class Bios:
             exit()
 
         try:
-            with open(path) as fh:
+            with open(path, 'rb') as fh:
                 file_data = fh.read()
         except IOError as e:
-            sm.error('Unable to read data from {0} error was:'.format(path), str(e))
+            sm.error(f'Unable to read data from {path} error was:', str(e))
             exit()
 
         bios_data = {}
 
         # XML bios file logic.
-        if re.search('<?xml version.*>', file_data):
-            file_data = re.sub('<!--.*-->\n', '', file_data)
-            file_data = re.sub('^\n', '', file_data)
-
+        # XML files, and the stamp comments at the top of XML Golden Templates, open with '<', where plain text files
+        # open with a comment or a [menu], so the first few bytes are enough to tell them apart.
+        if file_data[:64].lstrip().startswith(b'<'):
+            # Golden Templates carry their Vios stamp as comment lines ahead of the XML declaration, where a parser
+            # won't accept them. Start parsing at the declaration instead; comments inside the document are dropped by
+            # the parser itself.
+            source = io.BytesIO(file_data)
+            source.seek(max(file_data.find(b'<?xml'), 0))
+
+            # Parse the raw bytes so the parser honours the encoding declared by the file.
             try:
-                xml_root = ET.fromstring(file_data)
+                bios_data = self.parse_xml_tree(source)
             except ET.ParseError as e:
-                sm.error('Unable to parse xml in {0}. Error was:'.format(path), str(e))
+                sm.error(f'Unable to parse xml in {path}. Error was:', str(e))
                 exit()
 
-            for element in xml_root:
-                if element.tag == 'Menu' and element.attrib['name'] != 'Main':
-                    bios_data = self.parse_xml_tree(bios_data, element.attrib['name'], element)
-
         # Plain bios file logic
         else:
+            file_data = file_data.decode('utf-8', 'replace')
             if self.system_info.baseboard == Baseboard.SUPERMICRO:
-                file_data = re.sub('(#.*)', '', file_data)
-                file_data = re.sub('(//.*)', '', file_data)
-            elif self.system_info.baseboard == Baseboard.INTEL:
-                file_data = re.sub('(;.*)', '', file_data)
-
-            menu_list = re.split(r"\n\n", file_data)
-            for menu in menu_list:
-                menu_name = ''
-                try:
-                    menu_name = re.search('\[(.*)\]', menu).group(1)
-                except AttributeError:
-                    if menu:
-                        sm.error('Unable to acquire menu name for settings. Error occurred with:', menu)
+                token_re = _SUM_TOKEN_RE
+            else:
+                token_re = _INI_TOKEN_RE
+
+            # One pass over the file: each match is either a [menu] header or a setting belonging to the last header.
+            settings = None
+            for token in token_re.finditer(file_data):
+                menu_name, key, value = token.group('menu', 'key', 'val')
+                if menu_name is not None:
+                    settings = bios_data.setdefault(menu_name, {})
+                elif settings is None:
+                    sm.error('Unable to acquire menu name for settings. Error occurred with:', token.group(0))
+                else:
+                    settings[key.strip()] = ' '.join(value.split())
 
-                if menu_name:
-                    bios_data[menu_name] = {}
+        return bios_data
 
-                setting_list = re.findall('(.*)=(.*)', menu)
+    def _load_bios_data_cached(self, path):
+        """
+        get_bios_data() for files which rarely change, such as the Golden Template. The parsed settings are pickled
+        next to the file and reused for as long as the file's modification time and size, the baseboard type (which
+        decides how plain files are parsed) and the vios version (which may change the parser) stay the same.
 
-                for setting in setting_list:
-                    bios_data[menu_name][setting[0]] = re.sub('\s\s+', '', setting[1])
+        Called by:
+            --compare
 
+        :param path: file path and name to gather bios settings from.
+        :return: bios_data : Dictionary containing bios settings information
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            # Let get_bios_data report the missing file.
+            return self.get_bios_data(path)
+
+        key = (path, st.st_mtime_ns, st.st_size, self.system_info.baseboard, version)
+        cache_path = path + '.cache.pkl'
+        bios_data = _load_cache(cache_path, key)
+        if bios_data is None:
+            bios_data = self.get_bios_data(path)
+            _store_cache(cache_path, key, bios_data)
         return bios_data
 
-    def compare_settings(self, cb_data, gt_data, path='', diff=''):
+    def compare_settings(self, cb_data, gt_data):
         """
         Given two Dictionaries of bios settings, determine whether the settings are the same. If they are, indicate this
-        to the user. If they are not indicate which settings differ and which files they belong to.
+        to the user. If they are not indicate which settings differ and which files they belong to. Nested menus are
+        walked with an explicit stack rather than recursively.
 
         Called by:
             --compare
 
         :param cb_data: Current bios settings configured on the system.
         :param gt_data: Golden template bios settings configured on the system.
-        :param path: Path to the setting. (Menus)
-        :param diff: String for recording differences between current and golden template bios files.
+        :return diff_parts: List of strings recording differences between current and golden template bios files, to be
+                            joined by the caller. Empty if they match.
         """
-        if len(cb_data) != len(gt_data):
-            sm.error('Current BIOS settings and the Golden Template settings do not match... Are you sure the'
-                     'Golden Template is for this system?')
-            exit()
-
-        for key in cb_data.keys():
-            if key not in gt_data.keys():
-                sm.error('Menu: {0} was not found in the Golden Template BIOS settings. Please double check this.')
-            else:
-                if type(cb_data[key]) is dict:
-                    path = key
-                    diff = self.compare_settings(cb_data[key], gt_data[key], path, diff)
-                else:
-                    if cb_data[key] != gt_data[key]:
-                        diff += BOLD + path + ' -> ' + key + '\n' + END + \
-                               '\t Curent Bios Setting: ' + RED + cb_data[key] + END + '\n' + \
-                                '\t Golden Template Setting: ' + GREEN + gt_data[key] + END + '\n\n'
+        diff_parts = []
+        # Each entry is (path to the menu, current settings, golden template settings).
+        stack = [('', cb_data, gt_data)]
+
+        while stack:
+            path, cb_menu, gt_menu = stack.pop()
+            if len(cb_menu) != len(gt_menu):
+                sm.error('Current BIOS settings and the Golden Template settings do not match... Are you sure the '
+                         'Golden Template is for this system?')
+                exit()
 
-        return diff
+            sub_menus = []
+            for key, cb_value in cb_menu.items():
+                gt_value = gt_menu.get(key, _MISSING)
+                if gt_value is _MISSING:
+                    sm.error(f'Menu: {key} was not found in the Golden Template BIOS settings. Please double check '
+                             f'this.')
+                elif isinstance(cb_value, dict):
+                    sub_menus.append((path + '|' + key if path else key, cb_value, gt_value))
+                elif cb_value != gt_value:
+                    diff_parts.append(f'{BOLD}{path} -> {key}\n{END}\t Curent Bios Setting: {RED}{cb_value}{END}\n'
+                                      f'\t Golden Template Setting: {GREEN}{gt_value}{END}\n\n')
+            # Reversed so menus are popped, and reported, in the order they appear in the file.
+            stack.extend(reversed(sub_menus))
+
+        return diff_parts
 
     def compare_bios(self):
         """
@@ -589,9 +909,9 @@ class Bios:
         self.get_gt()
 
         cb_data = self.get_bios_data(self.current_bios_file)
-        gt_data = self.get_bios_data(self.gt_file)
+        gt_data = self._load_bios_data_cached(self.gt_file)
 
-        diff = self.compare_settings(cb_data, gt_data)
+        diff = ''.join(self.compare_settings(cb_data, gt_data))
 
         if diff == '':
             print(GREEN + 'No differences were found between the two files!' + END)
@@ -618,93 +938,139 @@ class Bios:
         :param gt_url: Web url specifying the Golden_Template to download and configure the system with.
         """
 
+        if self.ops is None:
+            sm.error('Unable to apply bios settings, Baseboard is not supported.')
+            return
+
         self.get_gt(gt_url)
-        print('Applying Golden Template settings from {0}... Please wait.'.format(self.gt_file))
+        print(f'Applying Golden Template settings from {self.gt_file}... Please wait.')
         try:
-            if self.system_info.baseboard == Baseboard.INTEL:
-                subprocess.check_call('syscfg /r {0} /b'.format(self.gt_file), shell=True)
+            subprocess.check_call(self.ops.apply_cmd(self.gt_file))
 
-                print(GREEN + 'BIOS settings successfully updated from Golden Template!' + END)
-                print(BOLD + 'Grabbing current bios settings.' + END)
-                self.get_bios_settings()
-                print(GREEN + 'Done.' + ' Please reboot the system for the changes to take effect.' + END)
+            print(GREEN + 'BIOS settings successfully updated from Golden Template!' + END)
+            print(BOLD + 'Grabbing current bios settings.' + END)
+            self.get_bios_settings()
+            print(GREEN + 'Done.' + ' Please reboot the system for the changes to take effect.' + END)
 
-            elif self.system_info.baseboard == Baseboard.SUPERMICRO:
-                subprocess.check_call('sum -c ChangeBiosCfg --file {0}'.format(self.gt_file), shell=True)
-
-                print(GREEN + 'BIOS settings successfully updated from Golden Template!' + END)
-                print(BOLD + 'Grabbing current bios settings.' + END)
-                self.get_bios_settings()
-                print(GREEN + 'Done.' + ' Please reboot the system for changes to take effect.' + END)
-
-            else:
-                sm.error('Unable to apply bios settings, Baseboard is not supported.')
-
-        except subprocess.CalledProcessError or OSError as e:
+        except (subprocess.CalledProcessError, OSError) as e:
             sm.error('Something went wrong while applying Golden Template settings, if using a url please make sure the'
                      ' Golden Tempate is for the current system. Error was:', str(e))
 
 
-def gather_system_info():
+def gather_system_info(needs=NEED_ALL, fallback=None):
     """
     Query Syscheck for information on the system. syscheck should return a json structure containing any and
     all information from trogdor for the system. Function also queries dmidecode for the motherboard manufacturer and
-    validates the activation status of a system if it is Supermicro.
+    validates the activation status of a system if it is Supermicro. Only the tools which provide the information
+    asked for by needs are run, fields of a SystemInfo which weren't needed are left empty.
 
+    :param needs:    Bitmask of NEED_* flags for the information required. The baseboard is always determined.
+    :param fallback: SystemInfo to return instead of exiting if syscheck, dmidecode or ipmicfg can't be run.
     :return system: A SystemInfo object which contains all important system information.
     """
     system = SystemInfo()
+    system.baseboard = Baseboard.OTHER
+    sys.stdout.write(_MSG_GATHER)
+    sys.stdout.flush()
+
+    # The kernel exports the DMI fields vios uses through sysfs, so they are read from there rather than by running
+    # dmidecode, which is only the fallback for fields sysfs doesn't have (board_serial is only readable by root).
+    # The vendor exported there gives the baseboard when Trogdor isn't asked or doesn't know it.
+    board_vendor = _read_dmi_id('board_vendor')
+    model = m_serial = bios = None
+    if needs & NEED_MODEL:
+        model = _read_dmi_id('board_name')
+        m_serial = _read_dmi_id('board_serial')
+    if needs & NEED_BIOS_VERSION:
+        bios = _read_dmi_id('bios_version')
+
+    queries = {}
+    if needs & NEED_MODEL and not (model and m_serial) or not (needs & NEED_TROGDOR or board_vendor):
+        queries['baseboard'] = ['dmidecode', '-t', 'baseboard']
+    if needs & NEED_BIOS_VERSION and not bios:
+        queries['bios'] = ['dmidecode', '-t', 'bios']
+    # ipmicfg is Supermicro's tool, there's no point running it on any other baseboard.
+    if needs & NEED_IPMI and (not board_vendor or b'supermicro' in board_vendor.lower()):
+        queries['ipmi'] = ['ipmicfg', '-ver']
 
     try:
-        print(YELLOW + 'Gathering system information... This may take a minute.' + END)
-        info = subprocess.check_output('syscheck -t --json', shell=True)
-        json_data = loads(info)
-    except subprocess.CalledProcessError:
-        sm.error('Syscheck failed to run, please ensure syscheck is installed and configured on the system.')
-        exit()
-    except Exception as e:
-        sm.error('Failed to acquire syscheck information. Error was:', str(e))
-        exit()
+        # The tools are independent and mostly spend their time starting up and waiting on the BMC, so run them side
+        # by side, and alongside syscheck, and wait for the slowest rather than for each in turn.
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = {name: executor.submit(_query, argv) for name, argv in queries.items()}
 
-    try:
-        if json_data['Components']['Motherboard']['Manufacturer'] == 'Supermicro':
-            system.baseboard = Baseboard.SUPERMICRO
-            system.binary = sum_binary
-            system.validate_system() # Supermicro systems require activation to work
-        elif json_data['Components']['Motherboard']['Manufacturer'] == 'Intel':
-            system.baseboard = Baseboard.INTEL
-            system.binary = intel_binary
-        else:
-            system.baseboard = Baseboard.OTHER
+            if needs & NEED_TROGDOR:
+                try:
+                    proc = subprocess.Popen(['syscheck', '-t', '--json'], stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL)
+                    info = proc.communicate()[0]
+                    if proc.returncode:
+                        raise subprocess.CalledProcessError(proc.returncode, proc.args, info)
+                    json_data = loads(info)
+                except (subprocess.CalledProcessError, OSError) as e:
+                    if fallback is not None:
+                        sm.error('Syscheck failed to run, using system information cached earlier. Error was:',
+                                 str(e))
+                        return fallback
+                    sm.error('Syscheck failed to run, please ensure syscheck is installed and configured on the '
+                             'system.')
+                    exit()
+                except Exception as e:
+                    sm.error('Failed to acquire syscheck information. Error was:', str(e))
+                    exit()
 
-        system.p_number = json_data['Project Number']
-        system.sm_number = json_data['SM Number']
-        system.customer = json_data['Customer Name']
-        system.order = json_data['Trogdor']['Order']
-        system.serial = json_data['Trogdor']['Serial']
+                system.baseboard = _MFG_MAP.get(json_data['Components']['Motherboard']['Manufacturer'],
+                                                Baseboard.OTHER)
 
-        try:
-            m_output = subprocess.check_output('dmidecode -t baseboard', shell=True)
-            b_output = subprocess.check_output('dmidecode -t bios', shell=True)
-            ipmi_output = subprocess.check_output('ipmicfg -ver', shell=True)
-        except subprocess.CalledProcessError or OSError as e:
-            sm.error('Something happened while gathering motherboard information... Error was:', str(e))
-            exit()
+                trogdor = json_data['Trogdor']
+                system.p_number = json_data['Project Number']
+                system.sm_number = json_data['SM Number']
+                system.customer = json_data['Customer Name']
+                system.order = trogdor['Order']
+                system.serial = trogdor['Serial']
+
+                # double check baseboard in case Trogdor didn't have info on the motherboard.
+                if system.baseboard == Baseboard.OTHER and not board_vendor and 'baseboard' not in futures:
+                    futures['baseboard'] = executor.submit(_query, ['dmidecode', '-t', 'baseboard'])
+
+            # Without a sysfs vendor ipmicfg is started before the baseboard is known, so it is collected after the
+            # baseboard is resolved and only has to succeed on a Supermicro board.
+            ipmi = futures.pop('ipmi', None)
+            try:
+                output = {name: future.result() for name, future in futures.items()}
+                if system.baseboard == Baseboard.OTHER:
+                    vendor = _VENDOR_RE.search(board_vendor or output.get('baseboard'))
+                    if vendor:
+                        system.baseboard = Baseboard(vendor.group(0).lower().decode('ascii'))
+                if ipmi is not None and system.baseboard == Baseboard.SUPERMICRO:
+                    output['ipmi'] = ipmi.result()
+            except (subprocess.CalledProcessError, OSError) as e:
+                if fallback is not None:
+                    sm.error('Unable to gather motherboard information, using system information cached earlier. '
+                             'Error was:', str(e))
+                    return fallback
+                sm.error('Something happened while gathering motherboard information... Error was:', str(e))
+                exit()
 
         try:
-            # double check baseboard in case Trogdor didn't have info on the motherboard.
-            if system.baseboard == Baseboard.OTHER:
-                if 'intel' in m_output.lower():
-                    system.baseboard = Baseboard.INTEL
-                elif 'supermicro' in m_output.lower():
-                    system.baseboard = Baseboard.SUPERMICRO
-
-
-            system.model = re.search('Product Name:\s+(.*)', m_output).group(1)
-            system.m_serial = re.search('Serial Number:\s+(.*)', m_output).group(1)
-            system.bios = re.search('Version:\s+(.*)', b_output).group(1)
-            system.ipmi_version = re.search('Firmware Version:\s+(.*)', ipmi_output).group(1)
-        except AttributeError as e:
+            m_output = output.get('baseboard')
+            if needs & NEED_MODEL:
+                if not (model and m_serial):
+                    fields = _fields(m_output)
+                    model = fields[b'Product Name']
+                    m_serial = fields[b'Serial Number']
+                system.model = model.decode('utf-8', 'replace')
+                system.m_serial = m_serial.decode('utf-8', 'replace')
+            if needs & NEED_BIOS_VERSION:
+                if not bios:
+                    bios = _fields(output['bios'])[b'Version']
+                system.bios = bios.decode('utf-8', 'replace')
+            if needs & NEED_IPMI:
+                if system.baseboard == Baseboard.SUPERMICRO and 'ipmi' in output:
+                    system.ipmi_version = _fields(output['ipmi'])[b'Firmware Version'].decode('utf-8', 'replace')
+                else:
+                    system.ipmi_version = 'N/A'
+        except (AttributeError, KeyError) as e:
             sm.error('Could not gather information system for Golden Template. Error was:', str(e))
             exit()
 
@@ -712,6 +1078,54 @@ def gather_system_info():
         sm.error('Failed to access information returned by syscheck. Error was:', str(e))
         exit()
 
+    ops = _BOARD_OPS.get(system.baseboard)
+    if ops is not None:
+        system.binary = ops.binary
+    if system.baseboard == Baseboard.SUPERMICRO:
+        system.validate_system() # Supermicro systems require activation to work
+
+    return system
+
+
+def load_system_info(needs=NEED_ALL, use_cache=True):
+    """
+    gather_system_info(), cached for the life of the boot. Trogdor and baseboard information doesn't change while the
+    system is up, so the SystemInfo from the first run is pickled to the bios_settings_dir and reused by later runs
+    until the system reboots or vios is upgraded.
+
+    The cache is also the fallback when querying fails, so a refresh which can't run a tool still has current
+    information to go on.
+
+    :param needs:     Bitmask of NEED_* flags for the information required. A cache gathered for fewer needs is not
+                      used.
+    :param use_cache: False to ignore any cached information and query the system again. --no-cache
+    :return system: A SystemInfo object which contains all important system information.
+    """
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as fh:
+            key = (fh.read().strip(), version)
+    except (IOError, OSError):
+        # No way to tell when the cache goes stale, so don't keep one.
+        return gather_system_info(needs)
+
+    cache_path = os.path.join(bios_settings_dir, f'sysinfo-{key[0]}.pkl')
+    cached = _load_cache(cache_path, key)
+    if cached is not None:
+        cached_needs, cached = cached
+        if cached_needs & needs == needs:
+            # The date names Golden Templates and is the time of this run, not of the run that filled the cache.
+            cached.date = time.strftime('%Y-%m-%d-%H-%M-%S')
+        else:
+            cached = None
+    if use_cache and cached is not None:
+        return cached
+
+    system = gather_system_info(needs, fallback=cached)
+    if system is cached:
+        return system
+    # Drop the caches of earlier boots once this one's is in place.
+    if _store_cache(cache_path, key, (needs, system)):
+        _purge('sysinfo-*.pkl', keep=cache_path)
     return system
 
 
@@ -726,6 +1140,7 @@ def parse_arguments():
         --compare: Compare the current bios settings to that of the Golden Template settings and display differences.
         --url: Given a supplied url to a Golden_Template apply the template to the system.
         --upload: Attempt to take the current bios settings and upload them to Jarvis as the Golden Template.
+        --no-cache: Gather system information again rather than reusing what was cached since the last reboot.
 
     :return: a list of arguments which have been selected by the user.
     """
@@ -749,6 +1164,9 @@ def parse_arguments():
                         help='Attempt to upload the current bios settings as the Golden Template for this system.')
     parser.add_argument('-d', '--display', action='store_true', dest='display',
                         help='Display Trogdor and BIOS information about the system.')
+    parser.add_argument('-nc', '--no-cache', action='store_true', dest='no_cache',
+                        help='Query the system for Trogdor and baseboard information even if it was cached by an '
+                             'earlier run since the last reboot.')
     args = parser.parse_args()
 
     return args
@@ -772,34 +1190,30 @@ if __name__ == '__main__':
         print('Vios version: ' + version)
         exit()
 
-    try:
-        os.mkdir(bios_settings_dir)
-    except (IOError, OSError):
-        pass
-
-    system = gather_system_info()
-
-    # Default argument
-    if args.display or len(sys.argv) == 1:
-        print(GREEN + 'Vios version: ' + version + END)
-        system.to_string()
-
-    if args.compare:
-        print(GREEN + 'Vios version: ' + version + END)
-        print('Beginning BIOS comparison...')
-        Bios(system).compare_bios()
-
-    if args.auto:
-        print(GREEN + 'Vios version: ' + version + END)
-        print('Starting auto features...')
-        Bios(system).apply_bios()
-
-    if args.url:
-        print(GREEN + 'Vios version: ' + version + END)
-        print('Applying {0} to system...'.format(args.url))
-        Bios(system).apply_bios(args.url)
-
-    if args.upload:
-        print(GREEN + 'Vios version: ' + version + END)
-        print('Starting upload procedures...')
-        Bios(system).upload_gt()
+    if not os.path.isdir(bios_settings_dir):
+        os.makedirs(bios_settings_dir, exist_ok=True)
+
+    # Work out what the selected features use, so only the tools providing it are run. Applying a Golden Template from
+    # a url only needs the baseboard, which is always determined.
+    display = args.display or not (args.compare or args.auto or args.url or args.upload)
+    needs = 0
+    if display or args.upload:
+        needs |= NEED_ALL
+    if args.compare or args.auto:
+        needs |= NEED_TROGDOR
+    system = load_system_info(needs, not args.no_cache)
+
+    # Features in the order they run, as (selected, banner, feature). Display is the default when nothing else is.
+    features = [
+        (display, None, system.to_string),
+        (args.compare, 'Beginning BIOS comparison...', lambda: Bios(system).compare_bios()),
+        (args.auto, 'Starting auto features...', lambda: Bios(system).apply_bios()),
+        (args.url, f'Applying {args.url} to system...', lambda: Bios(system).apply_bios(args.url)),
+        (args.upload, 'Starting upload procedures...', lambda: Bios(system).upload_gt()),
+    ]
+    for selected, banner, feature in features:
+        if selected:
+            sys.stdout.write(_HEADER + banner + '\n' if banner else _HEADER)
+            # The features run sum, syscfg and syscheck, which write to the same terminal.
+            sys.stdout.flush()
+            feature()